@@ -1,27 +1,36 @@
 from typing import List, Dict, Tuple
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import functools
 import re
 import os
+import time
 
 from semantic_search import (
     search,
     search_meetings,
     search_in_date_window,
 )
+import semantic_cache
 
-# OpenAI client setup (new SDK preferred, fallback legacy)
+# OpenAI client setup (new SDK preferred, fallback legacy).
+# The client itself is built lazily so importing this module stays cheap.
 try:
     from openai import OpenAI
-    _client = OpenAI()
     _use_client = True
 except Exception:
-    _client = None
+    OpenAI = None  # type: ignore
     _use_client = False
     import openai  # type: ignore
     openai.api_key = os.getenv("OPENAI_API_KEY")
 
+@functools.lru_cache(maxsize=1)
+def _get_client():
+    return OpenAI()
+
 COMPLETIONS_MODEL = "gpt-4o"
 MAX_CONTEXT_CHARS = 8000
+HISTORY_CHAR_BUDGET = 6000      # ≈1500 tokens at ~4 chars/token, reserved for history
+ASSISTANT_TRUNC_CHARS = 800     # assistant replies longer than this get summarized inline
 
 # ─────────────────────────────────────────────────────────────
 # Context Builder
@@ -29,25 +38,42 @@ MAX_CONTEXT_CHARS = 8000
 def build_context(topk: List[Tuple[int, float, Dict]]) -> str:
     """
     Create a compact context: [SOURCE: filename | CHUNK: id]
-    Then snippet text, respecting MAX_CONTEXT_CHARS.
+    Then snippet text, respecting MAX_CONTEXT_CHARS exactly
+    (the join separator is counted too, so we never overfill the budget).
     """
-    parts, total = [], 0
+    parts: List[str] = []
+    budget = MAX_CONTEXT_CHARS
+    sep_len = len("\n")
     for _, _, meta in topk:
         fname = meta.get("filename", "unknown.txt")
         cid = meta.get("chunk_id", 0)
-        text = meta.get("text_preview", "")
-        snippet = f"[SOURCE: {fname} | CHUNK: {cid}]\n{text}\n"
-        if total + len(snippet) > MAX_CONTEXT_CHARS:
+        snippet = f"[SOURCE: {fname} | CHUNK: {cid}]\n{meta.get('text_preview') or ''}\n"
+        cost = len(snippet) + (sep_len if parts else 0)
+        if cost > budget:
             break
         parts.append(snippet)
-        total += len(snippet)
+        budget -= cost
     return "\n".join(parts)
 
 # ─────────────────────────────────────────────────────────────
 # Date-window resolution from user query (extended)
 # ─────────────────────────────────────────────────────────────
-_MONTHS = "(january|february|march|april|may|june|july|august|september|october|november|december)"
+_MONTH_NAMES = (
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+)
+_MONTH_TO_NUM = {name: i for i, name in enumerate(_MONTH_NAMES, start=1)}
+_MONTHS = "(" + "|".join(_MONTH_NAMES) + ")"
 _Q_PAT = re.compile(r"\bq([1-4])\s*(?:[-/ ]?\s*)?(20\d{2})\b", re.I)  # Q1 2025 / Q3-2025 / Q4/2026
+_ISO_PAT = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+# One scan for all relative windows; dispatch on lastgroup instead of 5 substring passes
+_REL_WINDOW_PAT = re.compile(
+    r"\b(?:(?P<this_week>this week)|(?P<last_week>last week)|"
+    r"(?P<this_month>this month)|(?P<last_month>last month)|"
+    r"(?P<this_quarter>this quarter))\b"
+)
+_TEXT_DATE_PAT = re.compile(rf"{_MONTHS}\s+(\d{{1,2}}),\s*(\d{{4}})", re.I)  # September 2, 2025
+_SUMMARY_PAT = re.compile(r"\b(summary|summarize|decisions?|action items?)\b", re.I)
 
 def _quarter_bounds(q: int, year: int):
     # Q1: Jan–Mar; Q2: Apr–Jun; Q3: Jul–Sep; Q4: Oct–Dec
@@ -64,6 +90,50 @@ def _quarter_bounds(q: int, year: int):
         end.replace(hour=23, minute=59, second=59, microsecond=0),
     )
 
+def _day_start(d: date) -> datetime:
+    return datetime(d.year, d.month, d.day)
+
+def _day_end(d: date) -> datetime:
+    return datetime(d.year, d.month, d.day, 23, 59, 59)
+
+# The relative windows depend only on the calendar day, so they're memoized
+# per date — every query in a day reuses the same tuple.
+@functools.lru_cache(maxsize=32)
+def _this_week_window(today: date):
+    monday = today - timedelta(days=today.weekday())
+    return (_day_start(monday), _day_end(today))
+
+@functools.lru_cache(maxsize=32)
+def _last_week_window(today: date):
+    last_sun = today - timedelta(days=today.weekday() + 1)  # Mon=0
+    last_mon = last_sun - timedelta(days=6)
+    return (_day_start(last_mon), _day_end(last_sun))
+
+@functools.lru_cache(maxsize=32)
+def _this_month_window(today: date):
+    return (_day_start(today.replace(day=1)), _day_end(today))
+
+@functools.lru_cache(maxsize=32)
+def _last_month_window(today: date):
+    last_prev = today.replace(day=1) - timedelta(days=1)
+    return (_day_start(last_prev.replace(day=1)), _day_end(last_prev))
+
+@functools.lru_cache(maxsize=32)
+def _this_quarter_window(today: date):
+    m = today.month
+    qn = 1 if m <= 3 else 2 if m <= 6 else 3 if m <= 9 else 4
+    start, end = _quarter_bounds(qn, today.year)
+    end = min(end, _day_end(today))  # don't go into future
+    return (start, end)
+
+_REL_WINDOW_HANDLERS = {
+    "this_week": _this_week_window,
+    "last_week": _last_week_window,
+    "this_month": _this_month_window,
+    "last_month": _last_month_window,
+    "this_quarter": _this_quarter_window,
+}
+
 def resolve_date_window_from_query(q: str):
     """
     Recognize:
@@ -76,49 +146,11 @@ def resolve_date_window_from_query(q: str):
     Returns (start_dt, end_dt) or None.
     """
     s = q.lower().strip()
-    today = datetime.now()
-
-    # week windows
-    if "this week" in s:
-        monday = today - timedelta(days=today.weekday())
-        return (
-            monday.replace(hour=0, minute=0, second=0, microsecond=0),
-            today.replace(hour=23, minute=59, second=59, microsecond=0),
-        )
-
-    if "last week" in s:
-        weekday = today.weekday()  # Mon=0
-        last_sun = today - timedelta(days=weekday + 1)
-        last_mon = last_sun - timedelta(days=6)
-        return (
-            last_mon.replace(hour=0, minute=0, second=0, microsecond=0),
-            last_sun.replace(hour=23, minute=59, second=59, microsecond=0),
-        )
 
-    # month windows
-    if "this month" in s:
-        first = today.replace(day=1)
-        return (
-            first.replace(hour=0, minute=0, second=0, microsecond=0),
-            today.replace(hour=23, minute=59, second=59, microsecond=0),
-        )
-
-    if "last month" in s:
-        first_this = today.replace(day=1)
-        last_prev = first_this - timedelta(days=1)
-        first_prev = last_prev.replace(day=1)
-        return (
-            first_prev.replace(hour=0, minute=0, second=0, microsecond=0),
-            last_prev.replace(hour=23, minute=59, second=59, microsecond=0),
-        )
-
-    # quarter windows
-    if "this quarter" in s:
-        m = today.month
-        qn = 1 if m <= 3 else 2 if m <= 6 else 3 if m <= 9 else 4
-        start, end = _quarter_bounds(qn, today.year)
-        end = min(end, today.replace(hour=23, minute=59, second=59, microsecond=0))  # don't go into future
-        return (start, end)
+    # relative windows: one regex pass, dispatch on the matched group
+    rel = _REL_WINDOW_PAT.search(s)
+    if rel:
+        return _REL_WINDOW_HANDLERS[rel.lastgroup](date.today())
 
     qm = _Q_PAT.search(s)
     if qm:
@@ -127,21 +159,19 @@ def resolve_date_window_from_query(q: str):
         return _quarter_bounds(qn, year)
 
     # specific ISO date
-    m = re.search(r"(\d{4})-(\d{2})-(\d{2})", s)
+    m = _ISO_PAT.search(s)
     if m:
         y, mo, d = map(int, m.groups())
         start = datetime(y, mo, d, 0, 0, 0)
         end = datetime(y, mo, d, 23, 59, 59)
         return (start, end)
 
-    # textual date like "September 2, 2025"
-    m2 = re.search(rf"{_MONTHS}\s+(\d{{1,2}}),\s*(\d{{4}})", s, re.I)
+    # textual date like "September 2, 2025" — dict lookup beats strptime
+    m2 = _TEXT_DATE_PAT.search(s)
     if m2:
         month_name, dd, yy = m2.groups()
-        dt = datetime.strptime(f"{month_name} {dd} {yy}", "%B %d %Y")
-        start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-        end = dt.replace(hour=23, minute=59, second=59, microsecond=0)
-        return (start, end)
+        d = date(int(yy), _MONTH_TO_NUM[month_name.lower()], int(dd))
+        return (_day_start(d), _day_end(d))
 
     return None
 
@@ -160,12 +190,73 @@ def is_generative(q: str) -> bool:
 # ─────────────────────────────────────────────────────────────
 # Chat Completion
 # ─────────────────────────────────────────────────────────────
+def _create_completion(messages: List[Dict], stream: bool):
+    """Issue the completion request, retrying transient failures with backoff."""
+    last_err: Exception = RuntimeError("completion failed")
+    for attempt in range(3):
+        try:
+            if _use_client:
+                return _get_client().chat.completions.create(  # type: ignore
+                    model=COMPLETIONS_MODEL,
+                    messages=messages,
+                    temperature=0.2,
+                    stream=stream,
+                )
+            return openai.ChatCompletion.create(  # type: ignore
+                model=COMPLETIONS_MODEL,
+                messages=messages,
+                temperature=0.2,
+                stream=stream,
+            )
+        except Exception as e:
+            last_err = e
+            wait = 2.0 ** attempt
+            print(f"Completion error (attempt {attempt + 1}): {e}. Retrying in {wait:.1f}s...")
+            time.sleep(wait)
+    raise last_err
+
+def _trim_history(chat_history: List[Dict]) -> List[Dict]:
+    """
+    Prune the last few history turns before sending them to the model:
+    - drop duplicated consecutive contents,
+    - truncate long assistant replies (they're rarely referenced verbatim),
+    - keep timestamps only on user turns,
+    - stop once HISTORY_CHAR_BUDGET is spent (newest turns win).
+    """
+    kept: List[Dict] = []
+    used = 0
+    prev_content = None
+    for msg in reversed(chat_history[-4:]):
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        if content == prev_content:
+            continue
+        prev_content = content
+        if role == "assistant":
+            if len(content) > ASSISTANT_TRUNC_CHARS:
+                content = f"[earlier assistant reply, truncated]: {content[:200]}..."
+        else:
+            timestamp = msg.get("timestamp", "")
+            if timestamp:
+                content = f"[{timestamp}] {content}"
+        if used + len(content) > HISTORY_CHAR_BUDGET:
+            break
+        kept.append({"role": role, "content": content})
+        used += len(content)
+    kept.reverse()
+    return kept
+
 def ask_gpt(
     query: str,
     context: str = "",
     chat_history: List[Dict] = [],
     structure: str = "none",
-) -> str:
+    stream: bool = False,
+):
+    """
+    Returns the reply as a string, or — when stream=True — a generator of
+    text deltas so the UI can render tokens as they arrive.
+    """
     system = (
         "You are a precise Virtual CEO assistant. "
         "When sources are provided, use them and cite [filename#chunk] like [2025-09-02_Meeting-Summary.txt#2]. "
@@ -181,62 +272,79 @@ def ask_gpt(
         )
 
     messages: List[Dict] = [{"role": "system", "content": system}]
-
-    # Include up to last 4 chat history turns
-    for msg in chat_history[-4:]:
-        content = msg.get("content", "")
-        timestamp = msg.get("timestamp", "")
-        role = msg.get("role", "user")
-        formatted = f"[{timestamp}] {content}" if timestamp else content
-        messages.append({"role": role, "content": formatted})
+    messages.extend(_trim_history(chat_history))
 
     if context:
         messages.append({"role": "user", "content": f"Query:\n{query}\n\nSources:\n{context}"})
     else:
         messages.append({"role": "user", "content": query})
 
+    resp = _create_completion(messages[-6:], stream)
     if _use_client:
-        resp = _client.chat.completions.create(  # type: ignore
-            model=COMPLETIONS_MODEL,
-            messages=messages[-6:],
-            temperature=0.2,
-        )
+        if stream:
+            return (chunk.choices[0].delta.content or "" for chunk in resp)
         return resp.choices[0].message.content
     else:
-        resp = openai.ChatCompletion.create(  # type: ignore
-            model=COMPLETIONS_MODEL,
-            messages=messages[-6:],
-            temperature=0.2,
-        )
+        if stream:
+            return (chunk["choices"][0]["delta"].get("content", "") for chunk in resp)
         return resp.choices[0].message["content"]
 
 # ─────────────────────────────────────────────────────────────
 # Public API
 # ─────────────────────────────────────────────────────────────
+def _stream_and_cache(gen, qvec, query, win_key, restrict_to_meetings):
+    """Yield deltas to the caller, then store the full reply in the cache."""
+    parts: List[str] = []
+    for delta in gen:
+        parts.append(delta)
+        yield delta
+    semantic_cache.store(qvec, query, "".join(parts), win_key, restrict_to_meetings)
+
 def answer(
     query: str,
     k: int = 5,
     chat_history: List[Dict] = [],
     restrict_to_meetings: bool = False,
     use_rag: bool = True,
-) -> str:
+    stream: bool = False,
+):
     """
     - Detects relative/specific dates and restricts retrieval to that window when found.
     - Skips retrieval entirely for generative asks or when use_rag=False.
     - Structures meeting digests when appropriate (Agenda / Decisions / Action Items).
     - **Fallback B:** if restrict_to_meetings=True but no meeting hits are found, fall back to general search.
+    - Checks a semantic cache first: a near-identical recent query with the same
+      date window / meetings setting returns the stored answer without an LLM call.
+    - With stream=True, returns a generator of text deltas (cache hits still
+      return a plain string).
     """
     # Generative bypass or explicit GPT-only mode
     if not use_rag or is_generative(query):
-        return ask_gpt(query, context="", chat_history=chat_history, structure="none")
+        return ask_gpt(query, context="", chat_history=chat_history, structure="none", stream=stream)
 
     # Date-scoped search if query contains a window
     win = resolve_date_window_from_query(query)
+    win_key = f"{win[0]:%Y-%m-%d}..{win[1]:%Y-%m-%d}" if win else ""
+
+    # Semantic cache lookup before any retrieval / GPT work
+    qvec = None
+    try:
+        qvec = semantic_cache.embed_normalized(query)
+        cached = semantic_cache.lookup(qvec, win_key, restrict_to_meetings)
+        if cached is not None:
+            return cached
+    except Exception as e:
+        print(f"Semantic cache lookup skipped: {e}")
+
     if win:
         start, end = win
-        hits = search_in_date_window(query, start, end, k=k)
+        hits = search_in_date_window(query, start, end, k=k, query_embedding=qvec)
     else:
-        hits = search_meetings(query, k=k) if restrict_to_meetings else search(query, k=k)
+        hits = (
+            search_meetings(query, k=k, query_embedding=qvec)
+            if restrict_to_meetings
+            else search(query, k=k, query_embedding=qvec)
+        )
 
         # ── Fallback B: user forced meetings but none found → try general search
         def _has_meeting_hits(hs):
@@ -246,21 +354,28 @@ def answer(
             return False
 
         if restrict_to_meetings and (not hits or not _has_meeting_hits(hits)):
-            alt = search(query, k=k)
+            alt = search(query, k=k, query_embedding=qvec)
             if alt:
                 hits = alt
 
     if not hits:
-        return ask_gpt(query, context="", chat_history=chat_history, structure="none")
+        ctx, structure = "", "none"
+    else:
+        ctx = build_context(hits)
 
-    ctx = build_context(hits)
+        # Heuristic for structured meeting output
+        is_meeting_ctx = any((meta.get("folder", "").lower() == "meetings") for _, _, meta in hits)
+        wants_summary = bool(_SUMMARY_PAT.search(query))
+        structure = "meeting_summary" if (is_meeting_ctx and (restrict_to_meetings or wants_summary)) else "none"
 
-    # Heuristic for structured meeting output
-    is_meeting_ctx = any((meta.get("folder", "").lower() == "meetings") for _, _, meta in hits)
-    wants_summary = bool(re.search(r"\b(summary|summarize|decisions?|action items?)\b", query, re.I))
-    structure = "meeting_summary" if (is_meeting_ctx and (restrict_to_meetings or wants_summary)) else "none"
+    reply = ask_gpt(query, context=ctx, chat_history=chat_history, structure=structure, stream=stream)
 
-    return ask_gpt(query, context=ctx, chat_history=chat_history, structure=structure)
+    if qvec is None:
+        return reply
+    if stream:
+        return _stream_and_cache(reply, qvec, query, win_key, restrict_to_meetings)
+    semantic_cache.store(qvec, query, reply, win_key, restrict_to_meetings)
+    return reply
 
 # Optional CLI test
 if __name__ == "__main__":
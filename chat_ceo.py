@@ -1,14 +1,36 @@
+import csv
+import io
 import json
+import os
+import queue
 import re
+import threading
+from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime
 
-import pandas as pd
 import streamlit as st
 
-import file_parser
-import embed_and_store
-from answer_with_rag import answer
+# file_parser / embed_and_store / answer_with_rag are imported lazily in the
+# branches that need them — they pull in FAISS and the OpenAI SDK, which the
+# Login and History pages should never pay for.
+
+# orjson (optional) parses/serializes history turns several times faster
+# than stdlib json; fall back silently if it isn't installed.
+try:
+    import orjson
+
+    def _loads(s):
+        return orjson.loads(s)
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+except Exception:
+    def _loads(s):
+        return json.loads(s)
+
+    def _dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
 
 # ─────────────────────────────────────────────────────────────
 # App Config
@@ -19,8 +41,17 @@ st.set_page_config(page_title="AI CEO Assistant 🧠", page_icon="🧠", layout=
 USERNAME = "admin123"
 PASSWORD = "BestOrg123@#"
 
+# Compiled once; the reminder save path runs on the chat hot path
+_SAFE_TITLE_RE = re.compile(r"[^A-Za-z0-9_\-]+")
+_REMINDER_PREFIX_RE = re.compile(r"^reminder:\s*", re.I)
+_STRUCT_RE = re.compile(r"(?mi)^\s*(?:Title|Tags|ValidFrom|Body):")
+
+# Chat timestamp format (minute granularity)
+TS_FMT = "%b-%d-%Y %I:%M%p"
+
 # Paths
-HIST_PATH = Path("chat_history.json")
+HIST_PATH = Path("chat_history.jsonl")
+LEGACY_HIST_PATH = Path("chat_history.json")  # pre-JSONL format, migrated on first load
 REFRESH_PATH = Path("last_refresh.txt")
 
 # ─────────────────────────────────────────────────────────────
@@ -49,29 +80,80 @@ if not st.session_state["authenticated"]:
 # ─────────────────────────────────────────────────────────────
 # Helpers
 # ─────────────────────────────────────────────────────────────
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write-then-rename so a crash or rerun mid-write never leaves a torn file."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+@dataclass(slots=True)
+class Turn:
+    """One chat turn. Slot access in the render loops beats repeated dict.get."""
+    role: str
+    content: str
+    timestamp: str
+
+    def to_dict(self) -> dict:
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+
+def _as_turn(d: dict) -> Turn:
+    return Turn(d.get("role", "assistant"), d.get("content", ""), d.get("timestamp", "N/A"))
+
+@st.cache_data(show_spinner=False)
+def _load_history_cached(mtime: float):
+    # mtime is the cache key: appends touch the file and invalidate us, so
+    # ordinary reruns (widget clicks, keystrokes) never hit the disk.
+    # Defaults are resolved once here, so renders just read slots.
+    return [_as_turn(_loads(line)) for line in HIST_PATH.read_text(encoding="utf-8").splitlines() if line]
+
 def load_history():
+    if not HIST_PATH.exists() and LEGACY_HIST_PATH.exists():
+        # One-time migration from the old single-JSON format
+        turns = _loads(LEGACY_HIST_PATH.read_text(encoding="utf-8"))
+        atomic_write_text(HIST_PATH, "".join(_dumps(turn) + "\n" for turn in turns))
+        LEGACY_HIST_PATH.unlink()
     if HIST_PATH.exists():
-        return json.loads(HIST_PATH.read_text(encoding="utf-8"))
+        return _load_history_cached(HIST_PATH.stat().st_mtime)
     return []
 
-def save_history(history):
-    HIST_PATH.write_text(json.dumps(history, ensure_ascii=False, indent=2), encoding="utf-8")
+def iter_history():
+    """Stream turns one line at a time — peak memory is a single turn."""
+    if not HIST_PATH.exists():
+        return
+    with HIST_PATH.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield _loads(line)
+
+def append_turn(turn):
+    # O(1) per turn: append one JSONL line instead of rewriting the whole file
+    with HIST_PATH.open("a", encoding="utf-8") as f:
+        f.write(_dumps(turn) + "\n")
 
 def reset_chat():
-    if HIST_PATH.exists():
-        HIST_PATH.unlink()
+    for p in (HIST_PATH, LEGACY_HIST_PATH):
+        if p.exists():
+            p.unlink()
+    _load_history_cached.clear()
 
 def save_refresh_time():
-    REFRESH_PATH.write_text(datetime.now().strftime("%b-%d-%Y %I:%M %p"))
+    atomic_write_text(REFRESH_PATH, datetime.now().strftime("%b-%d-%Y %I:%M %p"))
+    load_refresh_time.clear()
 
+@st.cache_data(ttl=60, show_spinner=False)
 def load_refresh_time():
     if REFRESH_PATH.exists():
         return REFRESH_PATH.read_text()
     return "Never"
 
-def export_history_to_csv(history: list) -> bytes:
-    df = pd.DataFrame(history)
-    return df.to_csv(index=False).encode("utf-8")
+def export_history_to_csv(history) -> bytes:
+    """Serialize turns to CSV; accepts any iterable (list or iter_history())."""
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=["role", "content", "timestamp"], extrasaction="ignore")
+    w.writeheader()
+    w.writerows(history)
+    return buf.getvalue().encode("utf-8")
 
 def save_reminder_local(content: str, title_hint: str = "") -> str:
     """
@@ -84,12 +166,12 @@ def save_reminder_local(content: str, title_hint: str = "") -> str:
     ts = datetime.now().strftime("%Y-%m-%d_%H%M")
     # Prefer an explicit title, else first line of content
     title = (title_hint or content.strip().split("\n", 1)[0][:60] or "Untitled").strip()
-    safe_title = re.sub(r"[^A-Za-z0-9_\-]+", "_", title) or "Untitled"
+    safe_title = _SAFE_TITLE_RE.sub("_", title) or "Untitled"
 
     fp = reminders_dir / f"{ts}_{safe_title}.txt"
 
     # If content already includes Title:/Tags:/ValidFrom:/Body:, keep it as-is
-    is_structured = bool(re.search(r"(?mi)^\s*Title:|^\s*Tags:|^\s*ValidFrom:|^\s*Body:", content))
+    is_structured = bool(_STRUCT_RE.search(content))
     if is_structured:
         payload = content.strip() + "\n"
     else:
@@ -100,9 +182,63 @@ def save_reminder_local(content: str, title_hint: str = "") -> str:
             f"Body: {content.strip()}\n"
         )
 
-    fp.write_text(payload, encoding="utf-8")
+    atomic_write_text(fp, payload)
     return str(fp)
 
+REPORT_CSV = "embeddings/embedding_report.csv"
+
+@st.cache_data(show_spinner=False)
+def _load_report(mtime: float):
+    # mtime keys the cache; a re-embed rewrites the report and invalidates us.
+    # pandas is imported here (not at module top) so login/history pages and
+    # cache-hit reruns never pay its ~300 ms import cost.
+    import pandas as pd
+
+    return pd.read_csv(REPORT_CSV, dtype={"chunks": "int32", "chars": "int32"})
+
+def run_refresh_pipeline():
+    """
+    Overlap parsing and embedding: file_parser pushes each parsed path onto a
+    queue and embed_and_store consumes it immediately, so refresh wall time
+    approaches max(parse, embed) instead of their sum.
+    """
+    import file_parser
+    import embed_and_store
+
+    q: queue.Queue = queue.Queue()
+    parse_errors: list = []
+
+    def _produce():
+        try:
+            file_parser.main(on_file=q.put)
+        except Exception as e:
+            parse_errors.append(e)
+        finally:
+            q.put(None)  # sentinel: parsing finished
+
+    producer = threading.Thread(target=_produce, daemon=True)
+    producer.start()
+
+    def _parsed_paths():
+        seen = set()
+        while True:
+            p = q.get()
+            if p is None:
+                break
+            p = Path(p)
+            if p.name not in seen:
+                seen.add(p.name)
+                yield p
+        # also embed parsed files left over from earlier runs
+        for p in sorted(Path("parsed_data").glob("*.txt")):
+            if p.name not in seen:
+                yield p
+
+    embed_and_store.main(files=_parsed_paths())
+    producer.join()
+    if parse_errors:
+        raise parse_errors[0]
+
 # ─────────────────────────────────────────────────────────────
 # Sidebar
 # ─────────────────────────────────────────────────────────────
@@ -112,13 +248,14 @@ st.sidebar.markdown(f"👥 Logged in as: `{USERNAME}`")
 # Health report (embedding_report.csv) viewer
 with st.sidebar.expander("📊 Index health (embeddings)"):
     try:
-        df = pd.read_csv("embeddings/embedding_report.csv")
+        df = _load_report(os.path.getmtime(REPORT_CSV))
         st.caption(f"🧾 Rows: {len(df)}")
         # Flag sparse rows if columns exist
-        if set(["chunks", "chars"]).issubset(df.columns):
-            bad = df[(df["chunks"] == 0) | (df["chars"] < 200)]
-            if len(bad):
-                st.warning(f"⚠️ {len(bad)} file(s) look sparse (<200 chars or 0 chunks).")
+        if {"chunks", "chars"}.issubset(df.columns):
+            # count over the boolean mask — no row materialization
+            bad_n = int(((df["chunks"].to_numpy() == 0) | (df["chars"].to_numpy() < 200)).sum())
+            if bad_n:
+                st.warning(f"⚠️ {bad_n} file(s) look sparse (<200 chars or 0 chunks).")
         st.dataframe(df.tail(50), use_container_width=True, height=220)
     except Exception:
         st.caption("ℹ️ No report yet. Run **Refresh Data**.")
@@ -145,8 +282,8 @@ if mode == "🔁 Refresh Data":
     if st.button("🚀 Run File Parser + Embedder"):
         with st.spinner("⏳ Refreshing knowledge base..."):
             try:
-                file_parser.main()       # parses ./reminders into ./parsed_data + (optional) Drive
-                embed_and_store.main()   # re-embeds and writes FAISS + metadata
+                # parses ./reminders + (optional) Drive, embedding each file as it lands
+                run_refresh_pipeline()
                 save_refresh_time()
                 st.success("✅ Data refreshed and embedded successfully.")
                 st.markdown(f"🕒 Last Refreshed: **{load_refresh_time()}**")
@@ -159,15 +296,18 @@ elif mode == "📜 View History":
     if not history:
         st.info("ℹ️ No chat history found.")
     else:
-        for turn in history:
-            role = "👤 You" if turn.get("role") == "user" else "🧠 Assistant"
-            timestamp = turn.get("timestamp", "N/A")
-            st.markdown(f"**{role} | [{timestamp}]**  \n{turn.get('content', '')}")
+        # One widget for the whole log: a single joined markdown block is one
+        # websocket frame to the browser instead of one per turn.
+        parts = [
+            f"**{'👤 You' if turn.role == 'user' else '🧠 Assistant'} | [{turn.timestamp}]**  \n{turn.content}"
+            for turn in history
+        ]
+        st.markdown("\n\n---\n\n".join(parts))
 
         st.markdown("---")
         st.download_button(
             label="⬇️ Download Chat History as CSV",
-            data=export_history_to_csv(history),
+            data=export_history_to_csv(iter_history()),
             file_name="chat_history.csv",
             mime="text/csv",
         )
@@ -176,6 +316,8 @@ elif mode == "📜 View History":
             st.success("🧹 History cleared.")
 
 elif mode == "💬 New Chat":
+    from answer_with_rag import answer
+
     st.title("🧠 AI CEO Assistant")
     st.caption("📎 Ask about meetings, projects, policies. Start a message with **REMINDER:** to teach facts.")
     st.markdown(f"🕒 Last Refreshed: **{load_refresh_time()}**")
@@ -187,49 +329,67 @@ elif mode == "💬 New Chat":
     with colB:
         use_rag = st.checkbox("📚 Use internal knowledge (RAG)", value=True)
 
-    # Show prior turns
+    # Show prior turns — only the most recent window, so rerun cost stays
+    # flat as the conversation grows (full log lives in View History)
+    MAX_RENDER_TURNS = 50
     history = load_history()
-    for turn in history:
-        with st.chat_message(turn.get("role", "assistant")):
-            st.markdown(f"🗨️ [{turn.get('timestamp', 'N/A')}]  \n{turn.get('content', '')}")
+    if len(history) > MAX_RENDER_TURNS:
+        st.caption(f"ℹ️ Showing last {MAX_RENDER_TURNS} of {len(history)} turns — see 📜 View History for the rest.")
+    for turn in history[-MAX_RENDER_TURNS:]:
+        with st.chat_message(turn.role):
+            st.markdown(f"🗨️ [{turn.timestamp}]  \n{turn.content}")
 
     # Chat input
     user_msg = st.chat_input("✍️ Type your question or add a REMINDER…")
     if user_msg:
         # 1) If this is a REMINDER, save it immediately to ./reminders
         if user_msg.strip().lower().startswith("reminder:"):
-            body = re.sub(r"^reminder:\s*", "", user_msg.strip(), flags=re.I)
+            body = _REMINDER_PREFIX_RE.sub("", user_msg.strip())
             title_hint = body.split("\n", 1)[0][:60]
             saved_path = save_reminder_local(body, title_hint=title_hint)
             st.success(f"💾 Reminder saved: `{saved_path}`. Run **🔁 Refresh Data** to index it.")
 
-        # 2) Normal chat flow
-        now = datetime.now().strftime("%b-%d-%Y %I:%M%p")
-        history.append({"role": "user", "content": user_msg, "timestamp": now})
+        # 2) Normal chat flow — one strftime per submit, reused for both turns
+        ts = datetime.now().strftime(TS_FMT)
+        user_turn = Turn("user", user_msg, ts)
+        history.append(user_turn)
+        append_turn(user_turn.to_dict())
+        # answer() speaks dicts; it only reads the tail of the history
+        history_dicts = [t.to_dict() for t in history[-8:]]
 
         with st.chat_message("assistant"):
-            with st.spinner("🤔 Thinking…"):
-                try:
-                    # Prefer the new answer() signature with use_rag
-                    reply = answer(
-                        user_msg,
-                        k=7,
-                        chat_history=history,
-                        restrict_to_meetings=limit_meetings,
-                        use_rag=use_rag,
-                    )
-                except TypeError:
-                    # Backward compatible with older answer() signature
+            try:
+                # Prefer the new answer() signature with streaming + use_rag
+                result = answer(
+                    user_msg,
+                    k=7,
+                    chat_history=history_dicts,
+                    restrict_to_meetings=limit_meetings,
+                    use_rag=use_rag,
+                    stream=True,
+                )
+                if isinstance(result, str):
+                    # Cache hit or non-streaming path
+                    reply = result
+                    st.markdown(reply)
+                else:
+                    # Render tokens as they arrive
+                    reply = st.write_stream(result)
+            except TypeError:
+                # Backward compatible with older answer() signature
+                with st.spinner("🤔 Thinking…"):
                     reply = answer(
                         user_msg,
                         k=7,
-                        chat_history=history,
+                        chat_history=history_dicts,
                         restrict_to_meetings=limit_meetings,
                     )
-                except Exception as e:
-                    reply = f"Error: {e}"
-            ts = datetime.now().strftime("%b-%d-%Y %I:%M%p")
-            st.markdown(f"🧾 [{ts}]  \n{reply}")
+                st.markdown(reply)
+            except Exception as e:
+                reply = f"Error: {e}"
+                st.markdown(reply)
+            st.caption(f"🧾 [{ts}]")
 
-        history.append({"role": "assistant", "content": reply, "timestamp": ts})
-        save_history(history)
+        assistant_turn = Turn("assistant", reply, ts)
+        history.append(assistant_turn)
+        append_turn(assistant_turn.to_dict())
@@ -1,13 +1,17 @@
 from typing import List, Dict
 import re
 
+# Compiled once: simple_chunks runs on every file of every refresh, and the
+# per-call pattern-cache lookup adds up across a big corpus.
+_PARA_SPLIT = re.compile(r"\n{2,}")
+
 def simple_chunks(text: str, max_chars: int = 3500, overlap: int = 300) -> List[Dict]:
     """
     Split text into overlapping chunks at paragraph boundaries.
     - max_chars: soft limit per chunk
     - overlap: carry last N chars from previous chunk to next
     """
-    paras = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
+    paras = [p.strip() for p in _PARA_SPLIT.split(text) if p.strip()]
     chunks, cur, size = [], [], 0
     for p in paras:
         if size + len(p) + 2 <= max_chars:
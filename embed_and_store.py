@@ -1,8 +1,12 @@
 import os
+import functools
+import hashlib
+import sys
 import time
 import pickle
 import re
 import csv
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Optional, List
@@ -14,6 +18,23 @@ from tqdm import tqdm
 
 from chunk_utils import simple_chunks
 
+# zstandard (optional) shrinks the metadata pickle ~4-6x and speeds reload;
+# fall back to plain pickle if it isn't installed.
+try:
+    import zstandard as zstd
+except Exception:
+    zstd = None
+
+# pyarrow (optional) lets us store metadata as a columnar Parquet table:
+# dictionary-encoded strings dedupe the repeated filename/folder/path values
+# and the searcher can memory-map it instead of unpickling everything.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
+
 load_dotenv()
 
 # Prefer new SDK, fallback to legacy
@@ -33,37 +54,106 @@ EMBED_DIR.mkdir(parents=True, exist_ok=True)
 
 EMBED_MODEL = "text-embedding-3-small"
 EMBED_DIM = 1536
+EMBED_BATCH_SIZE = 128  # max chunks per embeddings.create call
+# Cap the estimated tokens per request too — 128 full-size chunks would blow
+# past the API's per-request token limit. ~4 chars/token is close enough for
+# packing; no tokenizer dependency needed.
+EMBED_TOKEN_BUDGET = 7000
+# In-flight embedding requests. Each batch is network-bound (~100-300 ms),
+# so overlapping a few of them hides most of the latency; keep it modest to
+# stay under OpenAI RPM/TPM limits.
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
+
+# How the persisted index is encoded:
+#   "flat"  — exact FP32 (default)
+#   "fp16"  — scalar-quantized half precision: 2x smaller, near-exact recall
+#   "sq8"   — scalar-quantized 8-bit with per-dim min/max calibration: 4x smaller
+#   "pq"    — product quantization, ~48x smaller
+#   "hnsw"  — graph index: sublinear search at full precision, more memory
+#   "ivfpq" — OPQ+IVF+PQ via index_factory: adds sublinear search on top of
+#             the compression, but needs a corpus big enough to train on
+INDEX_KIND = os.getenv("FAISS_INDEX_KIND", "flat").lower()
+# Clusters probed per IVF query; higher = better recall, slower search.
+IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+# Below this the IVF training set is too thin to be worth it; stay flat.
+IVFPQ_MIN_VECTORS = 10_000
 INDEX_PATH = EMBED_DIR / "faiss.index"
+# Raw float32 vectors keyed by hash of (model, text) — survives full rebuilds,
+# so re-embedding an unchanged corpus never hits the API.
+VEC_CACHE_DIR = EMBED_DIR / "vec_cache"
 META_PATH = EMBED_DIR / "metadata.pkl"
+META_PARQUET = EMBED_DIR / "metadata.parquet"
 REPORT_CSV = EMBED_DIR / "embedding_report.csv"
 
-_base_index = faiss.IndexFlatL2(EMBED_DIM)
+# Inner product over unit vectors is cosine similarity: same ranking as L2
+# on normalized data but roughly half the FLOPs per comparison.
+_base_index = faiss.IndexFlatIP(EMBED_DIM)
 _index = faiss.IndexIDMap2(_base_index)
 
 _metadata: Dict[int, Dict] = {}
 _next_id = 0
 
-_CANON_MEETING = re.compile(r'^(?P<y>\d{4})-(?P<m>\d{2})-(?P<d>\d{2})_Meeting-Summary', re.IGNORECASE)
-ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# (vid, meta, text) triples waiting to be embedded — buffered across files so
+# small files still fill full API batches.
+_pending: List[tuple] = []
+
+# Embedded batches held until the end of the build; they are concatenated and
+# added to FAISS in a single add_with_ids call.
+_vec_blocks: List[np.ndarray] = []
+_id_blocks: List[np.ndarray] = []
+
+# (filename, chunk_id, content hash) triples already in the loaded index —
+# chunks matching an entry here are skipped without an API call.
+_seen: set = set()
+
+# What this run actually saw: every chunk triple in the processed files and
+# the filenames themselves. After a resume, anything in _metadata outside
+# these sets is stale (chunk changed, file shrank or was deleted) and must
+# be dropped, or search keeps returning the superseded text.
+_current: set = set()
+_processed_files: set = set()
+
+# Non-ISO formats accepted in ValidFrom/ValidTo headers, tried in order
+_DATE_FORMATS = ("%Y/%m/%d", "%d-%m-%Y", "%d/%m/%Y", "%b %d %Y", "%B %d %Y")
 
 def _date_from_filename(fname: str) -> Optional[str]:
-    m = _CANON_MEETING.match(Path(fname).stem)
-    if not m:
+    # Canonical form is YYYY-MM-DD_Meeting-Summary*; plain slice checks are
+    # cheaper than a regex on this per-file hot path.
+    s = Path(fname).stem
+    if len(s) < 11 or s[4] != "-" or s[7] != "-" or s[10] != "_":
+        return None
+    if not s[11:].lower().startswith("meeting-summary"):
         return None
     try:
-        return datetime(int(m['y']), int(m['m']), int(m['d'])).strftime("%Y-%m-%d")
-    except Exception:
+        return datetime(int(s[:4]), int(s[5:7]), int(s[8:10])).strftime("%Y-%m-%d")
+    except ValueError:
         return None
 
+@functools.lru_cache(maxsize=4096)
 def _coerce_iso(d: Optional[str]) -> Optional[str]:
+    # Memoized: reminder files repeat the same handful of dates, and
+    # strptime is slow enough to matter across thousands of headers.
     if not d: return None
     d = d.strip()
-    if ISO_DATE.match(d): return d
-    for fmt in ("%Y/%m/%d", "%d-%m-%Y", "%d/%m/%Y", "%b %d %Y", "%B %d %Y"):
+    try:
+        return datetime.fromisoformat(d).strftime("%Y-%m-%d")
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
         try: return datetime.strptime(d, fmt).strftime("%Y-%m-%d")
         except Exception: pass
     return None
 
+# header key (lowercased, before ':') → (output field, value coercion)
+_HEADER_FIELDS = {
+    "[folder]": ("folder", str.strip),
+    "[file]": ("original_file", str.strip),
+    "title": ("title", str.strip),
+    "tags": ("tags", lambda v: [t.strip().lower() for t in v.replace(";", ",").split(",") if t.strip()]),
+    "validfrom": ("valid_from", _coerce_iso),
+    "validto": ("valid_to", _coerce_iso),
+}
+
 def _extract_headers(text: str) -> dict:
     """
     Read first ~25 lines of parsed file to capture:
@@ -71,21 +161,13 @@ def _extract_headers(text: str) -> dict:
       - For 'Reminders' files: Title/Tags/ValidFrom/ValidTo if present
     """
     out = {"folder": "", "original_file": "", "title": "", "tags": [], "valid_from": None, "valid_to": None}
-    lines = text.splitlines()[:25]
-    for ln in lines:
-        if ln.startswith("[FOLDER]:"):
-            out["folder"] = ln.split(":", 1)[1].strip()
-        elif ln.startswith("[FILE]:"):
-            out["original_file"] = ln.split(":", 1)[1].strip()
-        elif ln.lower().startswith("title:"):
-            out["title"] = ln.split(":", 1)[1].strip()
-        elif ln.lower().startswith("tags:"):
-            tags = ln.split(":", 1)[1]
-            out["tags"] = [t.strip().lower() for t in re.split(r"[;,]", tags) if t.strip()]
-        elif ln.lower().startswith("validfrom:"):
-            out["valid_from"] = _coerce_iso(ln.split(":", 1)[1])
-        elif ln.lower().startswith("validto:"):
-            out["valid_to"] = _coerce_iso(ln.split(":", 1)[1])
+    for ln in text.splitlines()[:25]:
+        key, sep, val = ln.partition(":")
+        if not sep:
+            continue
+        field = _HEADER_FIELDS.get(key.strip().lower())
+        if field:
+            out[field[0]] = field[1](val)
     return out
 
 def _embed_client(text: str) -> np.ndarray:
@@ -96,6 +178,14 @@ def _embed_legacy(text: str) -> np.ndarray:
     resp = openai.Embedding.create(model=EMBED_MODEL, input=text)  # type: ignore
     return np.asarray(resp["data"][0]["embedding"], dtype=np.float32)
 
+def _embed_client_batch(texts: List[str]) -> np.ndarray:
+    resp = _client.embeddings.create(model=EMBED_MODEL, input=texts)
+    return np.asarray([d.embedding for d in resp.data], dtype=np.float32)
+
+def _embed_legacy_batch(texts: List[str]) -> np.ndarray:
+    resp = openai.Embedding.create(model=EMBED_MODEL, input=texts)  # type: ignore
+    return np.asarray([d["embedding"] for d in resp["data"]], dtype=np.float32)
+
 def get_embedding(text: str) -> Optional[np.ndarray]:
     for attempt in range(4):
         try:
@@ -110,73 +200,388 @@ def get_embedding(text: str) -> Optional[np.ndarray]:
     print("Failed to embed after retries.")
     return None
 
-def add_to_index(vec: np.ndarray, vid: int) -> None:
-    _index.add_with_ids(vec.reshape(1, -1), np.array([vid], dtype=np.int64))
+def _request_embeddings(texts: List[str]) -> Optional[np.ndarray]:
+    """Embed a batch of texts in one API call. Returns (len(texts), EMBED_DIM) or None."""
+    for attempt in range(4):
+        try:
+            arr = _embed_client_batch(texts) if _use_client else _embed_legacy_batch(texts)
+            if arr.shape != (len(texts), EMBED_DIM):
+                raise ValueError(f"Unexpected embedding shape {arr.shape}")
+            return arr
+        except Exception as e:
+            wait = 1.5 ** attempt
+            print(f"Batch embedding error (attempt {attempt + 1}): {e}. Retrying in {wait:.1f}s...")
+            time.sleep(wait)
+    print("Failed to embed batch after retries.")
+    return None
+
+def _vec_cache_path(text: str) -> Path:
+    key = hashlib.blake2b((EMBED_MODEL + text).encode("utf-8"), digest_size=16).hexdigest()
+    return VEC_CACHE_DIR / key
+
+def _vec_cache_get(text: str) -> Optional[np.ndarray]:
+    try:
+        buf = _vec_cache_path(text).read_bytes()
+    except OSError:
+        return None
+    if len(buf) != EMBED_DIM * 4:
+        return None
+    return np.frombuffer(buf, dtype=np.float32)
+
+def get_embeddings(texts: List[str]) -> Optional[np.ndarray]:
+    """Embed texts, serving repeats from the on-disk vector cache.
+
+    Only cache misses go to the API (in one call); their vectors are written
+    back as raw float32 so later runs — including full rebuilds — reuse them.
+    """
+    out = np.empty((len(texts), EMBED_DIM), dtype=np.float32)
+    miss_idx: List[int] = []
+    for i, text in enumerate(texts):
+        vec = _vec_cache_get(text)
+        if vec is None:
+            miss_idx.append(i)
+        else:
+            out[i] = vec
+    if miss_idx:
+        fresh = _request_embeddings([texts[i] for i in miss_idx])
+        if fresh is None:
+            return None
+        VEC_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for slot, vec in zip(miss_idx, fresh):
+            out[slot] = vec
+            _vec_cache_path(texts[slot]).write_bytes(vec.tobytes())
+    return out
+
+def _reset_state() -> None:
+    """Start a fresh index/metadata build (main may run twice per process)."""
+    global _base_index, _index, _metadata, _next_id
+    _base_index = faiss.IndexFlatIP(EMBED_DIM)
+    _index = faiss.IndexIDMap2(_base_index)
+    _metadata = {}
+    _next_id = 0
+    _pending.clear()
+    _vec_blocks.clear()
+    _id_blocks.clear()
+    _seen.clear()
+    _current.clear()
+    _processed_files.clear()
+
+def _chunk_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+def _load_existing_metadata() -> Optional[Dict[int, Dict]]:
+    if pa is not None and META_PARQUET.exists():
+        tbl = pq.read_table(META_PARQUET, memory_map=True)
+        return {row["vector_id"]: row for row in tbl.to_pylist()}
+    if META_PATH.exists():
+        raw = META_PATH.read_bytes()
+        if zstd is not None and raw[:4] == b"\x28\xb5\x2f\xfd":
+            raw = zstd.ZstdDecompressor().decompress(raw)
+        return pickle.loads(raw)
+    return None
+
+def _load_existing() -> bool:
+    """Resume from the on-disk index so unchanged chunks cost zero API calls.
 
-def main():
+    Only the exact flat encoding can be extended in place; quantized kinds
+    are lossy re-encodings, so those runs rebuild from scratch.
+    """
+    global _base_index, _index, _metadata, _next_id
+    if INDEX_KIND != "flat" or not INDEX_PATH.exists():
+        return False
+    try:
+        index = faiss.read_index(str(INDEX_PATH))
+        metadata = _load_existing_metadata()
+        if metadata is None:
+            return False
+        base = faiss.downcast_index(index.index)
+        if not isinstance(base, (faiss.IndexFlatIP, faiss.IndexFlatL2)):
+            return False
+    except Exception as e:
+        print(f"Could not resume existing index ({e}); rebuilding.")
+        return False
+    _base_index = base
+    _index = index
+    _metadata = metadata
+    _next_id = max(metadata, default=-1) + 1
+    _seen.update((m.get("filename"), m.get("chunk_id"), m.get("hash")) for m in metadata.values())
+    print(f"Resuming from existing index ({index.ntotal} vectors).")
+    return True
+
+def embed_file(fp: Path) -> Optional[tuple]:
+    """
+    Chunk one parsed file and queue its chunks for batched embedding.
+    Returns the report row, or None if the file was empty.
+    """
     global _next_id
-    if not PARSED_DIR.exists():
-        print(f"Missing folder: {PARSED_DIR.resolve()}")
+    text = fp.read_text(encoding="utf-8").strip()
+    if not text:
+        print(f"Skipping empty: {fp.name}")
+        return None
+
+    headers = _extract_headers(text)
+    folder_label = headers["folder"]
+    orig_name = headers["original_file"] or fp.name
+
+    meeting_date_iso = _date_from_filename(orig_name) if folder_label.lower() == "meetings" else None
+    title = headers["title"]
+    tags = headers["tags"]
+    valid_from = headers["valid_from"]
+    valid_to = headers["valid_to"]
+
+    chunks = simple_chunks(text, max_chars=3500, overlap=300) or [{"chunk_id": 0, "text": text[:3500]}]
+    total_chars = sum(len(ch["text"]) for ch in chunks)
+
+    # Interned once per file: these strings repeat in every chunk's metadata
+    # row, so sharing one object each keeps the dict-of-dicts from holding
+    # hundreds of copies on large corpora.
+    fname = sys.intern(fp.name)
+    fpath = sys.intern(str(fp))
+    folder_label = sys.intern(folder_label)
+    title = sys.intern(title)
+
+    _processed_files.add(fname)
+    for ch in chunks:
+        h = _chunk_hash(ch["text"])
+        _current.add((fname, ch["chunk_id"], h))
+        if (fname, ch["chunk_id"], h) in _seen:
+            continue
+        meta = {
+            "filename": fname,
+            "path": fpath,
+            "chunk_id": ch["chunk_id"],
+            "hash": h,
+            "text_preview": ch["text"][:1000],
+            "folder": folder_label,
+            "meeting_date": meeting_date_iso,
+            "title": title,
+            "tags": tags,
+            "valid_from": valid_from,
+            "valid_to": valid_to,
+        }
+        _pending.append((_next_id, meta, ch["text"]))
+        _next_id += 1
+
+    return (fp.name, folder_label or "", meeting_date_iso or "", title, ";".join(tags), valid_from or "", valid_to or "", len(chunks), total_chars)
+
+def _est_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def _pending_full() -> bool:
+    """True once the buffer holds a batch worth flushing (count or tokens)."""
+    if len(_pending) >= EMBED_BATCH_SIZE:
+        return True
+    return sum(_est_tokens(text) for _, _, text in _pending) >= EMBED_TOKEN_BUDGET
+
+def _flush_pending(executor: ThreadPoolExecutor, inflight: List[tuple]) -> None:
+    """Greedy-pack one batch of queued chunks and submit it for embedding."""
+    if not _pending:
         return
+    tokens = 0
+    cut = 0
+    for _, _, text in _pending:
+        if cut >= EMBED_BATCH_SIZE:
+            break
+        n = _est_tokens(text)
+        if cut and tokens + n > EMBED_TOKEN_BUDGET:
+            break
+        tokens += n
+        cut += 1
+    batch = _pending[:cut]
+    del _pending[:cut]
+    future = executor.submit(get_embeddings, [text for _, _, text in batch])
+    inflight.append((future, batch))
+
+def _apply_oldest(inflight: List[tuple]) -> None:
+    """Wait for the oldest in-flight batch and stage it for the final add.
 
-    files = sorted([p for p in PARSED_DIR.iterdir() if p.is_file() and p.suffix.lower() == ".txt"])
-    if not files:
-        print("No .txt files found in parsed_data.")
+    Metadata writes and vector staging happen only here, on the caller's
+    thread, so the worker threads never touch shared state.
+    """
+    future, batch = inflight.pop(0)
+    vecs = future.result()
+    if vecs is None:
+        print(f"Skipping {len(batch)} chunks due to embedding failure.")
         return
+    ids = np.fromiter((vid for vid, _, _ in batch), dtype=np.int64, count=len(batch))
+    _vec_blocks.append(vecs)
+    _id_blocks.append(ids)
+    for vid, meta, _ in batch:
+        _metadata[vid] = meta
 
-    print(f"Found {len(files)} files to embed.")
-    report_rows: List[tuple] = [("filename", "folder", "meeting_date", "title", "tags", "valid_from", "valid_to", "chunks", "chars")]
+def _prune_stale(full_sweep: bool) -> None:
+    """Drop resumed vectors whose source chunk no longer exists as indexed.
 
-    for fp in tqdm(files, desc="Embedding"):
-        text = fp.read_text(encoding="utf-8").strip()
-        if not text:
-            print(f"Skipping empty: {fp.name}")
-            continue
+    A changed chunk gets a new hash and is appended under a new id; without
+    this pass the superseded vector would stay searchable forever. Entries
+    from files processed this run are pruned when their triple is gone; with
+    a full directory sweep, entries from files that vanished entirely are
+    pruned too.
+    """
+    stale = [
+        vid for vid, m in _metadata.items()
+        if (m.get("filename"), m.get("chunk_id"), m.get("hash")) not in _current
+        and (full_sweep or m.get("filename") in _processed_files)
+    ]
+    if not stale:
+        return
+    _index.remove_ids(np.asarray(stale, dtype=np.int64))
+    for vid in stale:
+        del _metadata[vid]
+    print(f"Pruned {len(stale)} stale vectors (changed or removed sources).")
+
+def _build_index() -> None:
+    """Add every staged vector to FAISS in one call.
+
+    One contiguous add crosses the Python/C++ boundary once and lets FAISS
+    size its storage a single time, instead of reallocating per batch.
+    """
+    if not _vec_blocks:
+        return
+    vecs = np.vstack(_vec_blocks)
+    ids = np.concatenate(_id_blocks)
+    # OpenAI embeddings arrive unit-norm already; normalize anyway so the
+    # IP metric is guaranteed to mean cosine.
+    faiss.normalize_L2(vecs)
+    _index.add_with_ids(vecs, ids)
+    _vec_blocks.clear()
+    _id_blocks.clear()
+
+def _quantized_base(kind: str, n: int) -> faiss.Index:
+    if kind == "fp16":
+        return faiss.IndexScalarQuantizer(EMBED_DIM, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    if kind == "sq8":
+        return faiss.IndexScalarQuantizer(EMBED_DIM, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    if kind == "pq":
+        return faiss.IndexPQ(EMBED_DIM, 16, 8, faiss.METRIC_INNER_PRODUCT)
+    if kind == "hnsw":
+        idx = faiss.IndexHNSWFlat(EMBED_DIM, 32, faiss.METRIC_INNER_PRODUCT)
+        idx.hnsw.efConstruction = 200  # build-time quality
+        idx.hnsw.efSearch = 64         # query-time recall/speed knob
+        return idx
+    if kind == "ivfpq":
+        if n < IVFPQ_MIN_VECTORS:
+            raise ValueError(f"only {n} vectors (< {IVFPQ_MIN_VECTORS}), IVF training would be too thin")
+        # ~39 training points per centroid is the FAISS rule of thumb
+        nlist = min(4096, max(64, n // 39))
+        return faiss.index_factory(EMBED_DIM, f"OPQ64,IVF{nlist},PQ64", faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"Unknown FAISS_INDEX_KIND: {kind!r}")
 
-        headers = _extract_headers(text)
-        folder_label = headers["folder"]
-        orig_name = headers["original_file"] or fp.name
-
-        meeting_date_iso = _date_from_filename(orig_name) if folder_label.lower() == "meetings" else None
-        title = headers["title"]
-        tags = headers["tags"]
-        valid_from = headers["valid_from"]
-        valid_to = headers["valid_to"]
-
-        chunks = simple_chunks(text, max_chars=3500, overlap=300) or [{"chunk_id": 0, "text": text[:3500]}]
-        total_chars = sum(len(ch["text"]) for ch in chunks)
-        report_rows.append((fp.name, folder_label or "", meeting_date_iso or "", title, ";".join(tags), valid_from or "", valid_to or "", len(chunks), total_chars))
-
-        for ch in chunks:
-            vec = get_embedding(ch["text"])
-            if vec is None:
-                print(f"Skipping chunk {ch['chunk_id']} of {fp.name} due to embedding failure.")
-                continue
-            add_to_index(vec, _next_id)
-            _metadata[_next_id] = {
-                "filename": fp.name,
-                "path": str(fp),
-                "chunk_id": ch["chunk_id"],
-                "text_preview": ch["text"][:1000],
-                "folder": folder_label,
-                "meeting_date": meeting_date_iso,
-                "title": title,
-                "tags": tags,
-                "valid_from": valid_from,
-                "valid_to": valid_to,
-            }
-            _next_id += 1
-
-    faiss.write_index(_index, str(INDEX_PATH))
-    with open(META_PATH, "wb") as f:
-        pickle.dump(_metadata, f)
-
-    with open(REPORT_CSV, "w", newline="", encoding="utf-8") as f:
-        csv.writer(f).writerows(report_rows)
+def _index_to_persist() -> faiss.Index:
+    """Optionally re-encode the flat build into a compact index before saving."""
+    if INDEX_KIND == "flat" or _base_index.ntotal == 0:
+        return _index
+    vecs = _base_index.reconstruct_n(0, _base_index.ntotal)
+    ids = np.fromiter(sorted(_metadata.keys()), dtype=np.int64, count=len(_metadata))
+    try:
+        base = _quantized_base(INDEX_KIND, _base_index.ntotal)
+        base.train(vecs)
+        if INDEX_KIND == "ivfpq":
+            faiss.extract_index_ivf(base).nprobe = IVF_NPROBE
+        out = faiss.IndexIDMap2(base)
+        out.add_with_ids(vecs, ids)
+        print(f"Re-encoded index as '{INDEX_KIND}' ({base.ntotal} vectors).")
+        return out
+    except Exception as e:
+        print(f"Index kind '{INDEX_KIND}' failed ({e}); keeping flat index.")
+        return _index
+
+def _write_metadata_parquet() -> bool:
+    """Write metadata as a columnar Parquet table. Returns False to fall back."""
+    if pa is None:
+        return False
+    try:
+        ids = sorted(_metadata)
+        dict_str = pa.dictionary(pa.int32(), pa.string())
+
+        def col(key):
+            # .get: entries resumed from pre-hash builds may lack new fields
+            return [_metadata[i].get(key) for i in ids]
+
+        tbl = pa.table({
+            "vector_id": pa.array(ids, type=pa.int64()),
+            "filename": pa.array(col("filename"), type=dict_str),
+            "path": pa.array(col("path"), type=dict_str),
+            "chunk_id": pa.array(col("chunk_id"), type=pa.int32()),
+            "hash": pa.array(col("hash"), type=pa.string()),
+            "text_preview": pa.array(col("text_preview"), type=pa.string()),
+            "folder": pa.array(col("folder"), type=dict_str),
+            "meeting_date": pa.array(col("meeting_date"), type=pa.string()),
+            "title": pa.array(col("title"), type=dict_str),
+            "tags": pa.array(col("tags"), type=pa.list_(pa.string())),
+            "valid_from": pa.array(col("valid_from"), type=pa.string()),
+            "valid_to": pa.array(col("valid_to"), type=pa.string()),
+        })
+        pq.write_table(tbl, META_PARQUET, compression="zstd")
+        # Remove a stale pickle so the searcher can't pick up old metadata
+        if META_PATH.exists():
+            META_PATH.unlink()
+        return True
+    except Exception as e:
+        print(f"Parquet metadata write failed ({e}); falling back to pickle.")
+        return False
+
+def _persist() -> None:
+    faiss.write_index(_index_to_persist(), str(INDEX_PATH))
+    if not _write_metadata_parquet():
+        payload = pickle.dumps(_metadata, protocol=pickle.HIGHEST_PROTOCOL)
+        if zstd is not None:
+            payload = zstd.ZstdCompressor(level=3).compress(payload)
+        META_PATH.write_bytes(payload)
 
     print(f"✅ Saved FAISS index to {INDEX_PATH}")
-    print(f"✅ Saved metadata for {len(_metadata)} vectors to {META_PATH}")
+    meta_out = META_PARQUET if META_PARQUET.exists() else META_PATH
+    print(f"✅ Saved metadata for {len(_metadata)} vectors to {meta_out}")
     print(f"📝 Wrote embedding health report to {REPORT_CSV}")
 
+def main(files=None, incremental: bool = True):
+    """
+    Embed parsed files into the FAISS index.
+    `files` may be any iterable of paths (e.g. a queue-fed generator from a
+    concurrent parse step); by default all of parsed_data/*.txt is used.
+    With `incremental` (the default) an existing flat index is extended and
+    chunks whose content hash is already indexed are skipped.
+    """
+    full_sweep = files is None
+    if files is None:
+        if not PARSED_DIR.exists():
+            print(f"Missing folder: {PARSED_DIR.resolve()}")
+            return
+        # scandir reuses the directory entry's type info — no stat per file
+        with os.scandir(PARSED_DIR) as it:
+            files = sorted(e.path for e in it if e.is_file() and e.name.lower().endswith(".txt"))
+        if not files:
+            print("No .txt files found in parsed_data.")
+            return
+        print(f"Found {len(files)} files to embed.")
+
+    _reset_state()
+    resumed = _load_existing() if incremental else False
+
+    inflight: List[tuple] = []
+    # Stream report rows as files finish — no in-memory row list, and a
+    # partial report survives a crash mid-run.
+    with open(REPORT_CSV, "w", newline="", encoding="utf-8") as rep:
+        report = csv.writer(rep)
+        report.writerow(("filename", "folder", "meeting_date", "title", "tags", "valid_from", "valid_to", "chunks", "chars"))
+        with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+            for fp in tqdm(files, desc="Embedding"):
+                row = embed_file(Path(fp))
+                if row:
+                    report.writerow(row)
+                while _pending_full():
+                    _flush_pending(executor, inflight)
+                while len(inflight) >= EMBED_CONCURRENCY:
+                    _apply_oldest(inflight)
+            while _pending:
+                _flush_pending(executor, inflight)
+            while inflight:
+                _apply_oldest(inflight)
+
+    if resumed:
+        _prune_stale(full_sweep)
+    _build_index()
+    _persist()
+
 if __name__ == "__main__":
     main()
@@ -1,12 +1,31 @@
 import os
 import io
 import csv
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# orjson (optional) parses/serializes several times faster than stdlib json;
+# fall back silently if it isn't installed.
+try:
+    import orjson
+
+    def _json_loads(s):
+        return orjson.loads(s)
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+except Exception:
+    def _json_loads(s):
+        return json.loads(s)
+
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj)
+
 import streamlit as st
 import docx
 import pandas as pd
-from PyPDF2 import PdfReader
 import fitz  # PyMuPDF
 
 # Optional Google Drive auth — safely skipped if secrets not present
@@ -30,18 +49,66 @@ OUTPUT_DIR = Path("parsed_data")
 OUTPUT_DIR.mkdir(exist_ok=True)
 
 LOWTEXT_LOG = OUTPUT_DIR / "low_text_files.csv"
+# Parser threads all append to the same log; interleaved writes would
+# corrupt rows without this.
+_lowtext_lock = threading.Lock()
+
+# Concurrent Drive files in flight. Download is pure I/O and PyMuPDF does its
+# extraction in C, so threads overlap most of the per-file latency.
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(8, os.cpu_count() or 4))))
 
 # ─────────────────────────────────────────────────────────────
 # Drive helpers (only used if 'service' is available)
 # ─────────────────────────────────────────────────────────────
 def list_folder_contents(parent_id):
-    results = service.files().list(
-        q=f"'{parent_id}' in parents and trashed = false",
-        fields='files(id, name, mimeType)',
-        supportsAllDrives=True,
-        includeItemsFromAllDrives=True
-    ).execute()
-    return results.get('files', [])
+    files = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=f"'{parent_id}' in parents and trashed = false",
+            fields='nextPageToken, files(id, name, mimeType)',
+            pageSize=1000,
+            pageToken=page_token,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True
+        ).execute()
+        files.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return files
+
+def list_many_folders(parent_ids):
+    """List the contents of several folders in as few requests as possible.
+
+    Drive accepts OR'd parent clauses, so ~10 folders share one round-trip
+    instead of one each; results come back keyed by parent id.
+    """
+    by_parent = {pid: [] for pid in parent_ids}
+    CHUNK = 10  # keeps the q string well under Drive's query-length cap
+    for i in range(0, len(parent_ids), CHUNK):
+        group = parent_ids[i:i + CHUNK]
+        if len(group) == 1:
+            by_parent[group[0]] = list_folder_contents(group[0])
+            continue
+        q = "(" + " or ".join(f"'{pid}' in parents" for pid in group) + ") and trashed = false"
+        page_token = None
+        while True:
+            results = service.files().list(
+                q=q,
+                fields='nextPageToken, files(id, name, mimeType, parents)',
+                pageSize=1000,
+                pageToken=page_token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True
+            ).execute()
+            for f in results.get('files', []):
+                for pid in f.get('parents', []):
+                    if pid in by_parent:
+                        by_parent[pid].append(f)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+    return by_parent
 
 def get_folder_id_by_exact_name(folder_name):
     results = service.files().list(
@@ -56,8 +123,21 @@ def get_folder_id_by_exact_name(folder_name):
         raise Exception(f"Folder '{folder_name}' not found in Drive.")
     return folders[0]['id']
 
+# googleapiclient's underlying httplib2 transport is not thread-safe, so each
+# parser thread downloads through its own service handle.
+_tls = threading.local()
+
+def _drive_service():
+    if service is None:
+        return None
+    svc = getattr(_tls, "service", None)
+    if svc is None:
+        svc = build("drive", "v3", credentials=creds, cache_discovery=False)
+        _tls.service = svc
+    return svc
+
 def download_file(file_id):
-    request = service.files().get_media(fileId=file_id)
+    request = _drive_service().files().get_media(fileId=file_id)
     fh = io.BytesIO()
     downloader = MediaIoBaseDownload(fh, request)
     done = False
@@ -69,14 +149,43 @@ def download_file(file_id):
 # ─────────────────────────────────────────────────────────────
 # Extractors
 # ─────────────────────────────────────────────────────────────
+# Text-only extraction: skip image decoding entirely and rejoin hyphenated
+# line breaks — graphics-heavy pages stop costing content-stream work that
+# never produces text anyway.
+_PDF_TEXT_FLAGS = fitz.TEXT_DEHYPHENATE | fitz.TEXT_PRESERVE_WHITESPACE
+
 def extract_text_from_pdf(fh: io.BytesIO) -> str:
-    data = fh.read()
-    doc = fitz.open(stream=data, filetype="pdf")
-    pages = [p.get_text("text") or "" for p in doc]
-    text = "\n".join(pages)
+    # getbuffer() hands PyMuPDF a zero-copy view of the download buffer —
+    # no fh.read() copy, so peak memory stays ~1x the file size.
+    doc = fitz.open(stream=fh.getbuffer(), filetype="pdf")
+    try:
+        # Pages are extracted sequentially on purpose: PyMuPDF documents are
+        # not thread-safe, so concurrency lives at the file level (one
+        # document per worker in _process_many), never inside one document.
+        text = "\n".join(p.get_text("text", flags=_PDF_TEXT_FLAGS) or "" for p in doc)
+    finally:
+        doc.close()
+        # MuPDF keeps decoded objects in a global store; shrink it so a run
+        # over many PDFs doesn't accumulate their caches.
+        fitz.TOOLS.store_shrink(100)
     if len(text.strip()) < 200:
-        reader = PdfReader(io.BytesIO(data))
-        text = "\n".join([page.extract_text() or "" for page in reader.pages])
+        # Near-empty extraction usually means a scanned PDF. Run PyMuPDF's
+        # OCR textpage (needs tesseract); keep the original text if OCR is
+        # unavailable or does no better.
+        try:
+            ocr_doc = fitz.open(stream=fh.getbuffer(), filetype="pdf")
+            try:
+                ocr_text = "\n".join(
+                    page.get_textpage_ocr(language="eng", dpi=150, full=True).extractText() or ""
+                    for page in ocr_doc
+                )
+            finally:
+                ocr_doc.close()
+                fitz.TOOLS.store_shrink(100)
+            if len(ocr_text.strip()) > len(text.strip()):
+                text = ocr_text
+        except Exception as e:
+            print(f"⚠️ OCR fallback unavailable ({e}); keeping extracted text.")
     return text
 
 def extract_text_from_docx(fh: io.BytesIO) -> str:
@@ -84,29 +193,68 @@ def extract_text_from_docx(fh: io.BytesIO) -> str:
     return "\n".join([p.text for p in d.paragraphs])
 
 def extract_text_from_excel(fh: io.BytesIO) -> str:
-    df = pd.read_excel(fh)
-    return df.to_string(index=False)
+    # read_only streams rows instead of building the whole sheet (or a
+    # DataFrame) in memory; tab-joined cells also skip to_string's padding.
+    try:
+        import openpyxl
+        wb = openpyxl.load_workbook(fh, read_only=True, data_only=True)
+        try:
+            buf = io.StringIO()
+            for ws in wb.worksheets:
+                for row in ws.iter_rows(values_only=True):
+                    buf.write("\t".join("" if c is None else str(c) for c in row))
+                    buf.write("\n")
+            return buf.getvalue()
+        finally:
+            # read-only workbooks keep the zip handle open until closed
+            wb.close()
+    except Exception:
+        # e.g. legacy .xls — let pandas pick the right engine. to_csv skips
+        # to_string's column-width computation; the embedder only needs text.
+        fh.seek(0)
+        df = pd.read_excel(fh)
+        buf = io.StringIO()
+        df.to_csv(buf, sep="\t", index=False)
+        return buf.getvalue()
 
 # ─────────────────────────────────────────────────────────────
 # Save parsed TXT with headers
 # ─────────────────────────────────────────────────────────────
+# Low-text rows are buffered here and written once per run (see
+# flush_low_text_log) instead of reopening the CSV per file.
+_LOW_TEXT_BUFFER: list = []
+
 def write_parsed_output(folder_label: str, name: str, text: str):
     base_name = os.path.splitext(name)[0].replace(' ', '_')
     output_path = OUTPUT_DIR / f"{base_name}.txt"
-    output_path.write_text(f"[FOLDER]: {folder_label}\n[FILE]: {name}\n\n{text}", encoding="utf-8")
+    # Write to a sidecar then rename, so an interrupted run never leaves a
+    # half-written .txt for the embedder to pick up.
+    tmp = output_path.with_suffix(".txt.tmp")
+    tmp.write_text(f"[FOLDER]: {folder_label}\n[FILE]: {name}\n\n{text}", encoding="utf-8")
+    os.replace(tmp, output_path)
     print(f"✅ Saved to {output_path}")
     if len(text.strip()) < 500:
-        hdr_exists = LOWTEXT_LOG.exists()
-        with open(LOWTEXT_LOG, "a", newline="", encoding="utf-8") as lf:
-            w = csv.writer(lf)
-            if not hdr_exists:
-                w.writerow(["folder","file","chars"])
-            w.writerow([folder_label, name, len(text.strip())])
+        with _lowtext_lock:
+            _LOW_TEXT_BUFFER.append((folder_label, name, len(text.strip())))
+    return output_path
+
+def flush_low_text_log():
+    """Append buffered low-text rows to the CSV log in one open/write."""
+    with _lowtext_lock:
+        rows, _LOW_TEXT_BUFFER[:] = list(_LOW_TEXT_BUFFER), []
+    if not rows:
+        return
+    hdr_exists = LOWTEXT_LOG.exists()
+    with open(LOWTEXT_LOG, "a", newline="", encoding="utf-8") as lf:
+        w = csv.writer(lf)
+        if not hdr_exists:
+            w.writerow(["folder","file","chars"])
+        w.writerows(rows)
 
 # ─────────────────────────────────────────────────────────────
 # Process Drive file (if Drive is configured)
 # ─────────────────────────────────────────────────────────────
-def process_and_save_drive(file, folder_label):
+def process_and_save_drive(file, folder_label, on_file=None):
     file_id = file['id']
     name = file['name']
     mime = file['mimeType']
@@ -124,63 +272,107 @@ def process_and_save_drive(file, folder_label):
         else:
             print(f"❌ Skipping unsupported file type: {name}")
             return
-        write_parsed_output(folder_label, name, text)
+        out = write_parsed_output(folder_label, name, text)
+        if on_file:
+            on_file(out)
     except Exception as e:
         print(f"❌ Error processing {name}: {e}")
 
 # ─────────────────────────────────────────────────────────────
 # Parse local reminders (*.txt) → parsed_data
 # ─────────────────────────────────────────────────────────────
-def parse_local_reminders():
+# Sidecar of {reminder filename: mtime} from the last run — unchanged
+# reminder files skip re-parsing entirely.
+PARSE_CACHE = OUTPUT_DIR / ".parse_cache.json"
+
+def _load_parse_cache() -> dict:
+    try:
+        return _json_loads(PARSE_CACHE.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def _save_parse_cache(cache: dict) -> None:
+    tmp = PARSE_CACHE.with_suffix(".json.tmp")
+    tmp.write_text(_json_dumps(cache), encoding="utf-8")
+    os.replace(tmp, PARSE_CACHE)
+
+def parse_local_reminders(on_file=None):
     folder = Path("reminders")
     if not folder.exists():
         return
+    cache = _load_parse_cache()
     for fp in folder.glob("*.txt"):
+        mtime = fp.stat().st_mtime
+        out_path = OUTPUT_DIR / f"{fp.stem.replace(' ', '_')}.txt"
+        if cache.get(fp.name) == mtime and out_path.exists():
+            continue  # unchanged since last run; embedder sweeps existing output
         text = fp.read_text(encoding="utf-8")
-        write_parsed_output("Reminders", fp.name, text)
+        out = write_parsed_output("Reminders", fp.name, text)
+        cache[fp.name] = mtime
+        if on_file:
+            on_file(out)
+    _save_parse_cache(cache)
 
 # ─────────────────────────────────────────────────────────────
 # Parse Drive sources (optional)
 # ─────────────────────────────────────────────────────────────
-def parse_knowledgebase_drive():
+def _process_many(pairs, on_file=None):
+    """Process (file, folder_label) pairs, fanning out across a thread pool."""
+    if len(pairs) <= 1:
+        for file, label in pairs:
+            process_and_save_drive(file, label, on_file=on_file)
+        return
+    with ThreadPoolExecutor(max_workers=PARSE_WORKERS) as ex:
+        futures = [ex.submit(process_and_save_drive, file, label, on_file=on_file) for file, label in pairs]
+        for fut in futures:
+            fut.result()
+
+def parse_knowledgebase_drive(on_file=None):
     parent_id = get_folder_id_by_exact_name(KB_FOLDER_NAME)
-    for folder in list_folder_contents(parent_id):
-        if folder['mimeType'] != 'application/vnd.google-apps.folder':
-            continue
-        label = folder['name']
-        print(f"\n📁 Scanning KB subfolder: {label}")
-        for file in list_folder_contents(folder['id']):
-            process_and_save_drive(file, label)
+    subfolders = [f for f in list_folder_contents(parent_id)
+                  if f['mimeType'] == 'application/vnd.google-apps.folder']
+    label_of = {f['id']: f['name'] for f in subfolders}
+    pairs = []
+    for fid, files in list_many_folders(list(label_of)).items():
+        label = label_of[fid]
+        print(f"\n📁 Scanning KB subfolder: {label} ({len(files)} files)")
+        pairs.extend((file, label) for file in files)
+    _process_many(pairs, on_file=on_file)
 
-def parse_reminders_drive():
+def parse_reminders_drive(on_file=None):
     try:
         rem_id = get_folder_id_by_exact_name(REMINDERS_FOLDER_NAME)
     except Exception:
         print(f"⚠️ Drive reminders folder '{REMINDERS_FOLDER_NAME}' not found; skipping.")
         return
     print(f"\n📁 Scanning Drive Reminders")
-    for file in list_folder_contents(rem_id):
-        process_and_save_drive(file, "Reminders")
+    _process_many([(file, "Reminders") for file in list_folder_contents(rem_id)], on_file=on_file)
 
 # ─────────────────────────────────────────────────────────────
 # Main
 # ─────────────────────────────────────────────────────────────
-def main():
+def main(on_file=None):
+    """
+    Parse all sources into parsed_data/*.txt.
+    `on_file` (optional) is called with each output path as soon as it is
+    written, so a downstream consumer (e.g. the embedder) can start early.
+    """
     print("🔎 Parsing sources into parsed_data/*.txt …")
     # Always parse local reminders first
-    parse_local_reminders()
+    parse_local_reminders(on_file=on_file)
 
     # Optionally parse Google Drive if configured
     if service is not None:
         try:
-            parse_knowledgebase_drive()
+            parse_knowledgebase_drive(on_file=on_file)
         except Exception as e:
             print(f"⚠️ Skipping Drive KnowledgeBase due to error: {e}")
         try:
-            parse_reminders_drive()
+            parse_reminders_drive(on_file=on_file)
         except Exception as e:
             print(f"⚠️ Skipping Drive Reminders due to error: {e}")
 
+    flush_low_text_log()
     print("✅ Parsing complete.")
 
 if __name__ == '__main__':
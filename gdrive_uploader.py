@@ -1,7 +1,11 @@
+import io
 import os
+import queue
+import threading
+import time
 import streamlit as st
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
 from google.oauth2 import service_account
 
 # ==============================
@@ -22,7 +26,16 @@ SHARED_DRIVE_ID = gdrive_secrets.get("shared_drive_id", None)
 # ==============================
 # Folder Logic
 # ==============================
+# Folder IDs never change for the life of the process; one files.list
+# round-trip per (name, parent) is enough.
+_folder_id_cache = {}
+
+
 def find_or_create_folder(service, name, parent_id=None):
+    cached = _folder_id_cache.get((name, parent_id))
+    if cached:
+        return cached
+
     query = (
         f"name = '{name}' and mimeType = 'application/vnd.google-apps.folder' "
         f"and trashed = false"
@@ -42,22 +55,24 @@ def find_or_create_folder(service, name, parent_id=None):
 
     folders = results.get("files", [])
     if folders:
-        return folders[0]["id"]
-
-    metadata = {
-        "name": name,
-        "mimeType": "application/vnd.google-apps.folder",
-    }
-    if parent_id:
-        metadata["parents"] = [parent_id]
+        folder_id = folders[0]["id"]
+    else:
+        metadata = {
+            "name": name,
+            "mimeType": "application/vnd.google-apps.folder",
+        }
+        if parent_id:
+            metadata["parents"] = [parent_id]
 
-    folder = service.files().create(
-        body=metadata,
-        fields="id",
-        supportsAllDrives=True
-    ).execute()
+        folder = service.files().create(
+            body=metadata,
+            fields="id",
+            supportsAllDrives=True
+        ).execute()
+        folder_id = folder["id"]
 
-    return folder["id"]
+    _folder_id_cache[(name, parent_id)] = folder_id
+    return folder_id
 
 
 # ==============================
@@ -97,3 +112,80 @@ def upload_or_update_file(service, file_path, folder_id):
             supportsAllDrives=True
         ).execute()
         print(f"✅ Uploaded: {file_name}")
+
+
+def upload_or_update_bytes(service, file_name, folder_id, data: bytes, mimetype="text/plain"):
+    """
+    Upload or update a file straight from memory — no temp file on disk,
+    no unlink afterwards.
+    """
+    query = f"'{folder_id}' in parents and name='{file_name}' and trashed = false"
+
+    results = service.files().list(
+        q=query,
+        spaces="drive",
+        fields="files(id, name)",
+        supportsAllDrives=True,
+        includeItemsFromAllDrives=True
+    ).execute()
+
+    files = results.get("files", [])
+    media = MediaIoBaseUpload(io.BytesIO(data), mimetype=mimetype, resumable=False)
+
+    if files:
+        file_id = files[0]["id"]
+        service.files().update(
+            fileId=file_id,
+            media_body=media,
+            supportsAllDrives=True
+        ).execute()
+        print(f"🔁 Updated: {file_name}")
+    else:
+        metadata = {"name": file_name, "parents": [folder_id]}
+        service.files().create(
+            body=metadata,
+            media_body=media,
+            fields="id",
+            supportsAllDrives=True
+        ).execute()
+        print(f"✅ Uploaded: {file_name}")
+
+
+# ==============================
+# Background Upload Queue
+# ==============================
+# Drive writes are slow (hundreds of ms at P50, seconds at P95) and rate
+# limited; doing them inline blocks the Streamlit request. Callers can
+# enqueue_upload() instead and return immediately — a daemon thread drains
+# the queue with exponential backoff and paces writes under Drive's
+# sustained ~3 writes/s ceiling.
+_upload_queue = queue.Queue()
+_worker_lock = threading.Lock()
+_worker = None
+
+
+def _drain_uploads():
+    while True:
+        file_name, data, folder_id, mimetype = _upload_queue.get()
+        for attempt in range(4):
+            try:
+                upload_or_update_bytes(service, file_name, folder_id, data, mimetype=mimetype)
+                break
+            except Exception as e:
+                wait = min(2.0 ** attempt, 47)
+                print(f"⚠️ Upload of {file_name} failed (attempt {attempt + 1}): {e}. Retrying in {wait:.0f}s...")
+                time.sleep(wait)
+        else:
+            print(f"❌ Giving up on {file_name} after retries.")
+        _upload_queue.task_done()
+        time.sleep(0.35)
+
+
+def enqueue_upload(file_name, data: bytes, folder_id, mimetype="text/plain"):
+    """Queue an upload and return immediately."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_drain_uploads, daemon=True)
+            _worker.start()
+    _upload_queue.put((file_name, data, folder_id, mimetype))
@@ -9,6 +9,10 @@ REM_DIR = Path("reminders")
 REM_DIR.mkdir(exist_ok=True)
 
 ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# Hoisted from call sites: extract_from_csv runs these per reminder row
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_\-]")
+_REMINDER_PREFIX = re.compile(r"^REMINDER:\s*", re.IGNORECASE)
+_TAG_SPLIT = re.compile(r"[;,]")
 
 SCHEMA_HELP = """\
 Expected reminder format (top lines):
@@ -21,7 +25,7 @@ Body: <one or a few lines of the actual fact/policy/decision>
 
 def _sanitize_filename(s: str, maxlen: int = 60) -> str:
     s = s.strip().replace(" ", "_")
-    s = re.sub(r"[^A-Za-z0-9_\-]", "_", s)
+    s = _UNSAFE_CHARS.sub("_", s)
     return s[:maxlen] if s else "untitled"
 
 def _coerce_iso(d: str | None) -> str | None:
@@ -47,7 +51,7 @@ def _parse_structured_block(text: str) -> dict:
 
     # If it's free text ("REMINDER: Some fact..."), wrap it:
     if not any(l.lower().startswith("title:") for l in lines):
-        body = re.sub(r"^REMINDER:\s*", "", text.strip(), flags=re.IGNORECASE)
+        body = _REMINDER_PREFIX.sub("", text.strip())
         return {
             "Title": body[:60] or "Untitled",
             "Tags": ["reminder"],
@@ -57,22 +61,22 @@ def _parse_structured_block(text: str) -> dict:
             "_auto_structured": True,
         }
 
-    # Structured parsing
+    # Structured parsing: one partition + dict lookup per line instead of
+    # cascading startswith checks (each of which re-lowered and re-split).
     out = {"Title": "", "Tags": [], "ValidFrom": None, "ValidTo": None, "Body": ""}
     buf_body = []
+    handlers = {
+        "title": lambda v: out.__setitem__("Title", v.strip()),
+        "tags": lambda v: out.__setitem__("Tags", [t.strip() for t in _TAG_SPLIT.split(v) if t.strip()]),
+        "validfrom": lambda v: out.__setitem__("ValidFrom", _coerce_iso(v)),
+        "validto": lambda v: out.__setitem__("ValidTo", _coerce_iso(v)),
+        "body": lambda v: buf_body.append(v.lstrip()),
+    }
     for l in lines:
-        low = l.lower()
-        if low.startswith("title:"):
-            out["Title"] = l.split(":", 1)[1].strip()
-        elif low.startswith("tags:"):
-            tags = l.split(":", 1)[1].strip()
-            out["Tags"] = [t.strip() for t in re.split(r"[;,]", tags) if t.strip()]
-        elif low.startswith("validfrom:"):
-            out["ValidFrom"] = _coerce_iso(l.split(":", 1)[1])
-        elif low.startswith("validto:"):
-            out["ValidTo"] = _coerce_iso(l.split(":", 1)[1])
-        elif low.startswith("body:"):
-            buf_body.append(l.split(":", 1)[1].lstrip())
+        key, sep, val = l.partition(":")
+        handler = handlers.get(key.strip().lower()) if sep else None
+        if handler:
+            handler(val)
         else:
             # part of body after "Body:" or free lines below header
             buf_body.append(l)
@@ -0,0 +1,115 @@
+import json
+import re
+import string
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import faiss
+
+from semantic_search import embed_query, EMBED_DIM
+
+CACHE_DIR = Path("cache")
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+INDEX_PATH = CACHE_DIR / "faiss.idx"
+STORE_PATH = CACHE_DIR / "entries.json"
+
+SIM_THRESHOLD = 0.92   # cosine similarity required for a cache hit
+MAX_RECORDS = 2000     # LRU eviction beyond this
+
+_WS_RE = re.compile(r"\s+")
+_PUNCT_TABLE = str.maketrans("", "", string.punctuation)
+
+_index: Optional[faiss.Index] = None
+_entries: Dict[int, Dict] = {}
+_next_id = 0
+_loaded = False
+
+# Streamlit runs each session in its own thread; lookup/store mutate the
+# module-level index and entries, so all access goes through one lock
+# (same treatment as _load_lock in semantic_search).
+_lock = threading.Lock()
+
+def normalize_query(q: str) -> str:
+    """Lowercase, strip punctuation, collapse whitespace — so rephrasings collide."""
+    return _WS_RE.sub(" ", q.lower().translate(_PUNCT_TABLE)).strip()
+
+def embed_normalized(q: str) -> np.ndarray:
+    """Embed the normalized query, L2-normalized so inner product = cosine."""
+    vec = embed_query(normalize_query(q)).reshape(1, -1)
+    faiss.normalize_L2(vec)
+    return vec
+
+def _fresh_index() -> faiss.Index:
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(EMBED_DIM))
+
+def _load() -> None:
+    global _index, _entries, _next_id, _loaded
+    if _loaded:
+        return
+    _loaded = True
+    if INDEX_PATH.exists() and STORE_PATH.exists():
+        try:
+            _index = faiss.read_index(str(INDEX_PATH))
+            raw = json.loads(STORE_PATH.read_text(encoding="utf-8"))
+            _entries = {int(k): v for k, v in raw.items()}
+            _next_id = (max(_entries) + 1) if _entries else 0
+            return
+        except Exception as e:
+            print(f"Semantic cache load failed ({e}); starting fresh.")
+    _index = _fresh_index()
+    _entries = {}
+    _next_id = 0
+
+def _persist() -> None:
+    faiss.write_index(_index, str(INDEX_PATH))
+    STORE_PATH.write_text(json.dumps(_entries, ensure_ascii=False), encoding="utf-8")
+
+def _evict_if_needed() -> None:
+    while len(_entries) > MAX_RECORDS:
+        oldest = min(_entries, key=lambda k: _entries[k].get("ts", 0))
+        _index.remove_ids(np.array([oldest], dtype=np.int64))
+        del _entries[oldest]
+
+def lookup(qvec: np.ndarray, win_key: str, restrict_to_meetings: bool) -> Optional[str]:
+    """
+    Return the cached answer if the nearest stored query is similar enough
+    AND was asked against the same (date window, meetings-only) settings.
+    """
+    with _lock:
+        _load()
+        if _index.ntotal == 0:
+            return None
+        D, I = _index.search(qvec, 1)
+        vid = int(I[0][0])
+        if vid == -1 or float(D[0][0]) < SIM_THRESHOLD:
+            return None
+        entry = _entries.get(vid)
+        if not entry:
+            return None
+        if entry.get("win_key", "") != win_key or bool(entry.get("restrict", False)) != restrict_to_meetings:
+            return None
+        entry["ts"] = time.time()
+        return entry.get("answer")
+
+def store(qvec: np.ndarray, query: str, answer: str, win_key: str, restrict_to_meetings: bool) -> None:
+    global _next_id
+    with _lock:
+        _load()
+        _index.add_with_ids(qvec, np.array([_next_id], dtype=np.int64))
+        _entries[_next_id] = {
+            "query": query,
+            "answer": answer,
+            "win_key": win_key,
+            "restrict": restrict_to_meetings,
+            "ts": time.time(),
+        }
+        _next_id += 1
+        _evict_if_needed()
+        try:
+            _persist()
+        except Exception as e:
+            print(f"Semantic cache persist failed: {e}")
@@ -1,4 +1,6 @@
+import functools
 import pickle
+import threading
 from pathlib import Path
 from typing import List, Tuple, Dict, Optional
 from datetime import datetime
@@ -8,6 +10,20 @@ import numpy as np
 import faiss
 from dotenv import load_dotenv
 
+# Metadata may be zstd-compressed (see embed_and_store._persist)
+try:
+    import zstandard as zstd
+except Exception:
+    zstd = None
+
+# Preferred metadata format is a Parquet table (see embed_and_store)
+try:
+    import pyarrow.parquet as pq
+except Exception:
+    pq = None
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
 load_dotenv()
 
 # Embedding for query
@@ -26,6 +42,7 @@ EMBED_DIM = 1536
 
 INDEX_PATH = Path("embeddings/faiss.index")
 META_PATH = Path("embeddings/metadata.pkl")
+META_PARQUET = Path("embeddings/metadata.parquet")
 
 def _embed_query_client(text: str) -> np.ndarray:
     resp = _client.embeddings.create(model=EMBED_MODEL, input=text)
@@ -35,23 +52,108 @@ def _embed_query_legacy(text: str) -> np.ndarray:
     resp = openai.Embedding.create(model=EMBED_MODEL, input=text)  # type: ignore
     return np.asarray(resp["data"][0]["embedding"], dtype=np.float32)
 
+@functools.lru_cache(maxsize=1024)
 def embed_query(text: str) -> np.ndarray:
+    # Memoized on the raw query string: re-asking (or re-running a Streamlit
+    # script with) the same query skips the OpenAI round-trip entirely.
     arr = _embed_query_client(text) if _use_client else _embed_query_legacy(text)
     if arr.shape != (EMBED_DIM,):
         raise ValueError(f"Unexpected embedding shape {arr.shape}")
     return arr
 
+def embed_queries(texts: List[str]) -> np.ndarray:
+    """Embed several queries in one API call. Returns (len(texts), EMBED_DIM)."""
+    if _use_client:
+        resp = _client.embeddings.create(model=EMBED_MODEL, input=list(texts))
+        arr = np.asarray([d.embedding for d in resp.data], dtype=np.float32)
+    else:
+        resp = openai.Embedding.create(model=EMBED_MODEL, input=list(texts))  # type: ignore
+        arr = np.asarray([d["embedding"] for d in resp["data"]], dtype=np.float32)
+    if arr.shape != (len(texts), EMBED_DIM):
+        raise ValueError(f"Unexpected embedding shape {arr.shape}")
+    return arr
+
+class _ParquetMetadata:
+    """dict-like view over the mmapped metadata table.
+
+    Only the vector_id column is materialized (for the id → row-index map);
+    full rows are built on demand for the ~k hits a query actually touches,
+    so load time and resident memory stay flat as the corpus grows.
+    """
+
+    def __init__(self, tbl):
+        self._tbl = tbl
+        self._row_of = {vid: i for i, vid in enumerate(tbl.column("vector_id").to_pylist())}
+
+    def get(self, vid, default=None):
+        i = self._row_of.get(vid)
+        if i is None:
+            return default
+        return {name: self._tbl.column(name)[i].as_py() for name in self._tbl.column_names}
+
+    def __len__(self):
+        return len(self._row_of)
+
+def _load_metadata(path: Path):
+    if path.suffix == ".parquet":
+        return _ParquetMetadata(pq.read_table(path, memory_map=True))
+    raw = path.read_bytes()
+    if raw[:4] == _ZSTD_MAGIC:
+        if zstd is None:
+            raise RuntimeError("Metadata is zstd-compressed but zstandard is not installed.")
+        raw = zstd.ZstdDecompressor().decompress(raw)
+    return pickle.loads(raw)
+
+def _meta_path() -> Path:
+    # Prefer the Parquet table when pyarrow can read it; older pickle
+    # metadata keeps working.
+    if pq is not None and META_PARQUET.exists():
+        return META_PARQUET
+    return META_PATH
+
+# Keeps the GPU resource object alive as long as the GPU index is in use
+_gpu_res = None
+
+def _maybe_gpu(index):
+    """Move the index to GPU when a CUDA FAISS build offers one."""
+    global _gpu_res
+    try:
+        if faiss.get_num_gpus() > 0:
+            _gpu_res = faiss.StandardGpuResources()
+            gpu_index = faiss.index_cpu_to_gpu(_gpu_res, 0, index)
+            print("FAISS index moved to GPU.")
+            return gpu_index
+    except AttributeError:
+        pass  # faiss-cpu build: no GPU API at all
+    except Exception as e:
+        print(f"GPU index unavailable ({e}); staying on CPU.")
+    return index
+
+@functools.lru_cache(maxsize=1)
+def _load_resources_cached(meta_path: str, index_mtime: float, meta_mtime: float):
+    # mtimes are the cache key: a re-embed touches the files and invalidates us.
+    index = _maybe_gpu(faiss.read_index(str(INDEX_PATH)))
+    metadata = _load_metadata(Path(meta_path))
+    return index, metadata
+
+# Serializes the actual load: concurrent Streamlit sessions otherwise race
+# past the cold lru_cache and each read the index from disk.
+_load_lock = threading.Lock()
+
 def load_resources():
-    if not INDEX_PATH.exists() or not META_PATH.exists():
+    meta = _meta_path()
+    if not INDEX_PATH.exists() or not meta.exists():
         raise FileNotFoundError("Missing FAISS index or metadata. Run embed_and_store.py first.")
-    index = faiss.read_index(str(INDEX_PATH))
-    with open(META_PATH, "rb") as f:
-        metadata = pickle.load(f)
-    return index, metadata
+    with _load_lock:
+        return _load_resources_cached(str(meta), INDEX_PATH.stat().st_mtime, meta.stat().st_mtime)
 
-def search(query: str, k: int = 5) -> List[Tuple[int, float, Dict]]:
+def _search_vec(qvec: np.ndarray, k: int = 5) -> List[Tuple[int, float, Dict]]:
+    """Vector-level search: no embedding, just FAISS + metadata lookup."""
     index, metadata = load_resources()
-    qvec = embed_query(query).reshape(1, -1)
+    qvec = np.asarray(qvec, dtype=np.float32).reshape(1, -1)
+    # The index stores unit vectors under an inner-product metric (cosine);
+    # the query must be unit-norm too. No-op if it already is.
+    faiss.normalize_L2(qvec)
     D, I = index.search(qvec, max(k, 50))
     out: List[Tuple[int, float, Dict]] = []
     for dist, idx in zip(D[0], I[0]):
@@ -59,7 +161,40 @@ def search(query: str, k: int = 5) -> List[Tuple[int, float, Dict]]:
         out.append((int(idx), float(dist), metadata.get(int(idx), {})))
     return out
 
+def search(query: str, k: int = 5, query_embedding: Optional[np.ndarray] = None) -> List[Tuple[int, float, Dict]]:
+    # Callers that already embedded the query (e.g. the semantic cache) can
+    # pass the vector in to skip a second OpenAI round-trip.
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    return _search_vec(query_embedding, k)
+
+def batch_search(queries: List[str], k: int = 5) -> List[List[Tuple[int, float, Dict]]]:
+    """Search several queries in one FAISS call.
+
+    Embeds all queries in a single API request, stacks them into a (B, d)
+    matrix and lets FAISS sweep the index once for the whole batch —
+    cheaper than B serial searches when the UI fires meetings + reminders
+    + window lookups together. Returns one result list per query, in
+    input order.
+    """
+    if not queries:
+        return []
+    index, metadata = load_resources()
+    qmat = embed_queries(list(queries))
+    faiss.normalize_L2(qmat)
+    D, I = index.search(qmat, max(k, 50))
+    out: List[List[Tuple[int, float, Dict]]] = []
+    for row_d, row_i in zip(D, I):
+        hits: List[Tuple[int, float, Dict]] = []
+        for dist, idx in zip(row_d, row_i):
+            if idx == -1: continue
+            hits.append((int(idx), float(dist), metadata.get(int(idx), {})))
+        out.append(hits)
+    return out
+
+@functools.lru_cache(maxsize=4096)
 def _parse_iso(s: Optional[str]) -> Optional[datetime]:
+    # Memoized: the same meeting/validity dates recur across every query
     if not s: return None
     try: return datetime.strptime(s, "%Y-%m-%d")
     except Exception: return None
@@ -69,38 +204,56 @@ def _query_tags(query: str) -> List[str]:
     vocab = {"hr","hiring","recruiting","finance","budget","expense","policy","product","engineering","data","sales","ops","legal","org","roles","ai","coordinator"}
     return [t for t in toks if t in vocab]
 
+def _similarity_metric() -> bool:
+    """True if the loaded index returns similarities (higher = closer)."""
+    index, _ = load_resources()
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
 def rerank(results: List[Tuple[int, float, Dict]], query: str, prefer_meetings: bool = False, prefer_recent: bool = False) -> List[Tuple[int,float,Dict]]:
+    if not results:
+        return results
     qtags = set(_query_tags(query))
     now = datetime.now()
+    higher_is_closer = _similarity_metric()
 
-    def score(item):
-        _, dist, meta = item
-        base = -dist  # smaller distance → larger score
-        folder = str(meta.get("folder","")).lower()
+    # One pass to fill parallel bonus arrays, one numpy expression to score,
+    # one argsort — no per-item Python sort key.
+    n = len(results)
+    dists = np.fromiter((dist for _, dist, _ in results), dtype=np.float64, count=n)
+    # IP indexes return similarities, L2 indexes distances — orient both
+    # so larger means closer (keeps old on-disk L2 indexes working)
+    base = dists if higher_is_closer else -dists
+    folder_bonus = np.zeros(n)
+    meet_bonus = np.zeros(n)
+    tag_bonus = np.zeros(n)
+    validity_bonus = np.zeros(n)
+
+    for i, (_, _, meta) in enumerate(results):
+        if prefer_meetings and str(meta.get("folder", "")).lower() == "meetings":
+            folder_bonus[i] = 1000
 
         # Meetings recency
-        meet_date = _parse_iso(meta.get("meeting_date"))
-        meet_bonus = (meet_date.toordinal()*10) if (prefer_recent and meet_date) else 0
-        folder_bonus = 1000 if (prefer_meetings and folder == "meetings") else 0
+        if prefer_recent:
+            meet_date = _parse_iso(meta.get("meeting_date"))
+            if meet_date:
+                meet_bonus[i] = meet_date.toordinal() * 10
 
         # Reminders: tag overlap + validity
-        tags = set((meta.get("tags") or []))
-        tag_overlap = len(qtags & {t.lower() for t in tags})
-        tag_bonus = tag_overlap * 500
+        tags = meta.get("tags") or []
+        if qtags and tags:
+            tag_bonus[i] = len(qtags & {t.lower() for t in tags}) * 500
 
         vfrom = _parse_iso(meta.get("valid_from"))
         vto = _parse_iso(meta.get("valid_to"))
-        valid_now = True
-        if vfrom and now < vfrom: valid_now = False
-        if vto and now > vto: valid_now = False
-        validity_bonus = 0 if valid_now else -1000
-
-        return folder_bonus*1_000_000 + meet_bonus + tag_bonus + validity_bonus + base
+        if (vfrom and now < vfrom) or (vto and now > vto):
+            validity_bonus[i] = -1000
 
-    return sorted(results, key=score, reverse=True)
+    scores = folder_bonus * 1_000_000 + meet_bonus + tag_bonus + validity_bonus + base
+    order = np.argsort(-scores, kind="stable")
+    return [results[i] for i in order]
 
-def search_meetings(query: str, k: int = 5, prefer_recent: bool = True) -> List[Tuple[int, float, Dict]]:
-    raw = search(query, k=max(k, 100))
+def search_meetings(query: str, k: int = 5, prefer_recent: bool = True, query_embedding: Optional[np.ndarray] = None) -> List[Tuple[int, float, Dict]]:
+    raw = search(query, k=max(k, 100), query_embedding=query_embedding)
     re_ranked = rerank(raw, query=query, prefer_meetings=True, prefer_recent=prefer_recent)
     return re_ranked[:k]
 
@@ -115,8 +268,8 @@ def filter_by_date_range(results: List[Tuple[int, float, Dict]], start: datetime
 def rerank_for_recency(results: List[Tuple[int, float, Dict]], query: str, favor_recent: bool = True) -> List[Tuple[int, float, Dict]]:
     return rerank(results, query=query, prefer_meetings=False, prefer_recent=favor_recent)
 
-def search_in_date_window(query: str, start: datetime, end: datetime, k: int = 5) -> List[Tuple[int, float, Dict]]:
-    pool = search(query, k=max(k, 200))
+def search_in_date_window(query: str, start: datetime, end: datetime, k: int = 5, query_embedding: Optional[np.ndarray] = None) -> List[Tuple[int, float, Dict]]:
+    pool = search(query, k=max(k, 200), query_embedding=query_embedding)
     windowed = filter_by_date_range(pool, start, end)
     if not windowed:
         return []